@@ -1,16 +1,21 @@
 from dotenv import load_dotenv
-from gradio.utils import P
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI, OpenAIError
+import httpx
 import os
-import gradio as gr
 import psycopg
-from pypdf import PdfReader
-import json
-from pydantic import BaseModel, Field, ValidationError
+from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
+import orjson
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
 from datetime import date
-from datetime import timedelta
-import datetime
-from typing import Optional
+from typing import Callable, Optional
+from types import SimpleNamespace
+import atexit
+import time
+import hashlib
+import threading
+import asyncio
+import importlib.util
 
 load_dotenv(override=True)
 
@@ -20,6 +25,25 @@ dbpassword = os.getenv("PGPASSWORD")
 dbhost = os.getenv("PGHOST")
 dbname = os.getenv("PGDATABASE")
 
+# Shared connection pool so cache refreshes reuse warm backends instead of
+# paying for a fresh connect + auth handshake on every query.
+POOL = ConnectionPool(
+    conninfo=f"dbname={dbname} user={dbuser} host={dbhost} password={dbpassword}",
+    min_size=2,
+    max_size=10,
+    kwargs={"autocommit": True},
+    open=True,
+)
+atexit.register(POOL.close)
+
+# Shared HTTP client for OpenAI calls: HTTP/2 multiplexing and long-lived
+# keep-alive connections avoid a fresh TLS handshake on every chat turn.
+# HTTP/2 needs the optional h2 package (httpx[http2]); without it, fall back to HTTP/1.1.
+HTTP_CLIENT = httpx.AsyncClient(
+    http2=importlib.util.find_spec("h2") is not None,
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=60),
+)
+
 class AddBookInput(BaseModel):
     title: str = Field(..., description="The title of the book.")
     author: str = Field(..., description="The author of the book.")
@@ -28,80 +52,157 @@ class AddBookInput(BaseModel):
     date_completed: Optional[date] = Field(None, description="The date the user completed the book, in YYYY-MM-DD format.")
     short_story: bool = Field(False, description="Whether the book is a short story. True for short story, False otherwise.")
 
+# Validator for AddBookInput, built once at import
+_BOOK_ADAPTER = TypeAdapter(AddBookInput)
+
+# Pydantic v2 error types reported back to the AI with a friendlier message
+_MISSING_ERROR_TYPES = {'missing'}
+_DATE_ERROR_TYPES = {'date_parsing', 'date_from_datetime_parsing', 'date_from_datetime_inexact', 'date_type'}
+
+
+# Sort order used for the book list: in-progress books first, then completed,
+# then obtained-but-unread, each group newest first. sort_bucket and sort_date are
+# generated columns backed by books_sort_idx (see migrations/001_books_sort_index.sql).
+BOOKS_ORDER_BY = "sort_bucket, sort_date DESC"
+
+# Number of books listed in full; the rest of the library is only counted by genre,
+# so the prompt stays the same size however large the library grows.
+BOOKS_LIST_LIMIT = 50
+
+# Renders the BOOKS_LIST_LIMIT first books in sort order (the most recently active)
+# as compact pipe-separated rows, followed by book counts per genre across the whole
+# library, as a single TEXT value so Python does not have to format each row.
+# Columns are described by _BOOKS_HEADER; missing values are left empty (concat_ws
+# would otherwise skip NULLs and shift the columns), and any '|' within a text field
+# is replaced with '/' for the same reason.
+BOOKS_TEXT_SQL = f"""
+    SELECT concat_ws(E'\\n\\n',
+        (SELECT string_agg(line, E'\\n' ORDER BY {BOOKS_ORDER_BY})
+         FROM (
+            SELECT concat_ws('|',
+                replace(COALESCE(title, ''), '|', '/'),
+                replace(COALESCE(author, ''), '|', '/'),
+                replace(COALESCE(genre, ''), '|', '/'),
+                COALESCE(TO_CHAR(datestartedreading, 'YYYY-MM-DD'), ''),
+                COALESCE(TO_CHAR(datecompleted, 'YYYY-MM-DD'), ''),
+                CASE WHEN shortstory THEN 'Y' ELSE 'N' END
+            ) AS line, sort_bucket, sort_date
+            FROM books
+            ORDER BY {BOOKS_ORDER_BY}
+            LIMIT {BOOKS_LIST_LIMIT}
+         ) AS recent),
+        (SELECT 'Books by genre (whole library): ' || string_agg(genre || ': ' || genre_count, ', ' ORDER BY genre_count DESC, genre)
+         FROM (SELECT COALESCE(genre, 'Unknown') AS genre, COUNT(*) AS genre_count FROM books GROUP BY 1) AS genres)
+    ) AS books
+"""
+
+# Delimiters placed around the book list in the AI context. The header doubles as
+# the legend for the compact row format, which keeps the prompt's token count down.
+_BOOKS_HEADER = (
+    "\n" + "-" * 45 + " All Books in Library " + "-" * 45 + "\n"
+    f"The {BOOKS_LIST_LIMIT} most recently active books, one per line: t|a|g|s|c|ss = title|author|genre|date started reading|date completed|short story (Y/N)\n"
+    "t|a|g|s|c|ss\n"
+)
+_BOOKS_FOOTER = "\n" + "-" * 120 + "\n"
+
+def create_ai_prompt_from_books(books_text: Optional[str]) -> str:
+    """
+    Wraps the pre-formatted book list in clear delimiters so it reads as a
+    distinct block in an AI model's context.
 
-def get_books():
+    Args:
+        books_text: The book list as returned by get_library_snapshot(), with each
+                    book already rendered as a pipe-separated line and the
+                    genre counts after it.
+
+    Returns:
+        A formatted string containing all the book data.
     """
-    Fetches book data from the PostgreSQL database.
+    if not books_text:
+        return "No book data available in the library."
+
+    return _BOOKS_HEADER + books_text + _BOOKS_FOOTER
+
+# All stats available as columns of the books_stats materialized view
+# (see migrations/). Median completion times are already formatted as "N day(s)".
+ALL_POSSIBLE_STATS = [
+    'in_progress',
+    'completed_books',
+    'completed_short_stories',
+    'books_this_year',
+    'short_stories_this_year',
+    'total_books',
+    'total_short_stories',
+    'total_all',
+    'median_completion_days_all',
+    'median_completion_days_novels',
+    'median_completion_days_this_year'
+]
+
+# Stats retrieved when no specific stats are requested
+DEFAULT_STATS = [
+    'in_progress', 'completed_books', 'completed_short_stories',
+    'books_this_year', 'short_stories_this_year',
+    'total_all',
+    'median_completion_days_all',
+    'median_completion_days_novels',
+    'median_completion_days_this_year'
+]
+
+REFRESH_STATS_SQL = "REFRESH MATERIALIZED VIEW CONCURRENTLY books_stats"
+
+# Whether the view's "this year" stats are for the current year. Compared in SQL so
+# both sides use the database's clock and TimeZone rather than the app host's.
+STATS_CURRENT_SQL = "stats_year = EXTRACT(YEAR FROM CURRENT_DATE)::int AS stats_current"
+
+def _refresh_stats(conn):
+    """
+    Refreshes the books_stats view. A failure is only logged, not raised: after a
+    write, the write is already committed (the pool runs in autocommit), so
+    reporting it as failed would invite a duplicate, and the view catches up on
+    the next successful refresh.
+
+    Returns:
+        bool: True if the view was refreshed.
     """
     try:
-        with psycopg.connect(f"dbname={dbname} user={dbuser} host={dbhost} password={dbpassword}") as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT (title, author, genre, datecompleted, datestartedreading, shortstory) FROM books
-                    ORDER BY
-                    CASE
-                        WHEN dateCompleted IS NULL AND dateStartedReading IS NOT NULL THEN 1
-                        WHEN dateCompleted IS NOT NULL THEN 2
-                        WHEN dateCompleted IS NULL AND dateStartedReading IS NULL AND dateObtained IS NOT NULL THEN 3
-                        ELSE 4
-                    END,
-                    CASE
-                        WHEN dateCompleted IS NULL AND dateStartedReading IS NOT NULL THEN dateStartedReading
-                        WHEN dateCompleted IS NOT NULL THEN dateCompleted
-                        WHEN dateCompleted IS NULL AND dateStartedReading IS NULL AND dateObtained IS NOT NULL THEN dateObtained
-                        ELSE NULL
-                    END DESC
-                """)
-                return cur.fetchall()
+        conn.execute(REFRESH_STATS_SQL)
     except psycopg.Error as e:
-        print(f"Database error: {e}")
-        return []
+        print(f"Could not refresh books_stats: {e}")
+        return False
+    return True
 
-def create_ai_prompt_from_books(books_data: list[tuple]) -> str:
+def _build_stats_query(selected_stats):
     """
-    Transforms a list of book data tuples (with a nested tuple) into a
-    well-structured, human-readable string suitable for an AI model's context.
-
-    Args:
-        books_data: A list of tuples, where each tuple contains another tuple
-                    with book information in the order:
-                    (title, author, genre, datecompleted, datestartedreading, shortstory).
-
-    Returns:
-        A formatted string containing all the book data, with each book
-        separated by a clear delimiter.
+    Builds a SELECT of the given stat columns from books_stats, plus
+    stats_current (see _fetch_stats_row).
     """
-    if not books_data:
-        return "No book data available in the library."
+    return f"SELECT {', '.join(selected_stats)}, {STATS_CURRENT_SQL} FROM books_stats;"
 
-    # A list to hold the formatted strings for each book
-    formatted_books = []
-
-    # Iterate through the list of book tuples
-    for book_outer_tuple in books_data:
-        # Unpack the nested tuple to get the book's data
-        book = book_outer_tuple[0]
-
-        # Unpack the inner tuple for easier access to each field
-        title, author, genre, datecompleted, datestartedreading, shortstory = book
-
-        # Format the information for a single book.
-        # We use a f-string for easy readability and variable insertion.
-        # The formatting is designed to be clear and consistent for the AI.
-        book_string = (
-            f"Title: {title}\n"
-            f"Author: {author}\n"
-            f"Genre: {genre}\n"
-            f"Date Started Reading: {datestartedreading}\n"
-            f"Date Completed: {datecompleted}\n"
-            f"Short Story: {'No' if shortstory == 'f' else 'Yes'}\n"
-        )
-        formatted_books.append(book_string)
+DEFAULT_STATS_SQL = _build_stats_query(DEFAULT_STATS)
 
-    # Join all the formatted book strings together with a separator
-    # to make each book a distinct block of information.
-    # The final string is then returned.
-    return "\n" + "---" * 15 + " All Books in Library " + "---" * 15 + "\n" + "\n".join(formatted_books) + "\n" + "---" * 40 + "\n"
+# Books and default stats in one round-trip (see get_library_snapshot)
+LIBRARY_SNAPSHOT_SQL = f"""
+    WITH b AS ({BOOKS_TEXT_SQL})
+    SELECT b.books, {', '.join('s.' + stat_name for stat_name in DEFAULT_STATS)}, s.{STATS_CURRENT_SQL}
+    FROM b, books_stats s;
+"""
+
+def _fetch_stats_row(cur, query):
+    """
+    Executes a query that selects STATS_CURRENT_SQL and returns its row as a dict
+    (the cursor must use dict_row) without that column. If the view was last
+    refreshed in a previous year, its "this year" stats are stale, so it is
+    refreshed and the query re-run first. If the refresh fails, the stale row is
+    returned rather than failing the read.
+    """
+    cur.execute(query, prepare=True)
+    row = cur.fetchone()
+    if not row.pop('stats_current') and _refresh_stats(cur.connection):
+        cur.execute(query, prepare=True)
+        row = cur.fetchone()
+        del row['stats_current']
+    return row
 
 def get_stats(requested_stats=None):
     """
@@ -118,75 +219,143 @@ def get_stats(requested_stats=None):
                                          If None or empty, all common stats are retrieved.
     Returns:
         dict: A dictionary where keys are stat names and values are their counts or medians.
-              Returns an empty dict if no valid stats are found or no data.
+              Returns an empty dict if no valid stats are found or the database cannot be reached.
     """
-    with psycopg.connect(f"dbname={dbname} user={dbuser} host={dbhost} password={dbpassword}") as conn:
-        with conn.cursor() as cur:
-            # Get current year for filtering "this year" stats
-            current_year = datetime.date.today().year
-
-            # Define all possible stats and their corresponding SQL expressions
-            # All filters now live WITHIN the COUNT/PERCENTILE_CONT expressions.
-            all_possible_stats = {
-                'in_progress': "COUNT(id) FILTER (WHERE datestartedreading IS NOT NULL AND datecompleted IS NULL)",
-                'completed_books': "COUNT(id) FILTER (WHERE datecompleted IS NOT NULL AND shortstory = false)",
-                'completed_short_stories': "COUNT(id) FILTER (WHERE datecompleted IS NOT NULL AND shortstory = true)",
-                'books_this_year': f"COUNT(id) FILTER (WHERE datecompleted IS NOT NULL AND EXTRACT(YEAR FROM datecompleted) = {current_year} AND shortstory = false)",
-                'short_stories_this_year': f"COUNT(id) FILTER (WHERE datecompleted IS NOT NULL AND EXTRACT(YEAR FROM datecompleted) = {current_year} AND shortstory = true)",
-                'total_books': "COUNT(id) FILTER (WHERE shortstory = false)",
-                'total_short_stories': "COUNT(id) FILTER (WHERE shortstory = true)",
-                'total_all': "COUNT(id)",
-                'median_completion_days_all': "PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY (datecompleted - datestartedreading)) FILTER (WHERE datestartedreading IS NOT NULL AND datecompleted IS NOT NULL)",
-                'median_completion_days_novels': "PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY (datecompleted - datestartedreading)) FILTER (WHERE datestartedreading IS NOT NULL AND datecompleted IS NOT NULL AND shortstory = false)",
-                'median_completion_days_this_year': f"PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY (datecompleted - datestartedreading)) FILTER (WHERE datestartedreading IS NOT NULL AND datecompleted IS NOT NULL AND EXTRACT(YEAR FROM datecompleted) = {current_year} AND shortstory = false)"
-            }
+    if not requested_stats:
+        query = DEFAULT_STATS_SQL
+    else:
+        # Validate requested_stats against ALL_POSSIBLE_STATS
+        selected_stats = [stat for stat in requested_stats if stat in ALL_POSSIBLE_STATS]
+        if not selected_stats:
+            return {} # No valid stats requested
+        query = _build_stats_query(selected_stats)
 
-            # If no specific stats are requested, retrieve a default set
-            if not requested_stats:
-                selected_stats = [
-                    'in_progress', 'completed_books', 'completed_short_stories',
-                    'books_this_year', 'short_stories_this_year',
-                    'total_all',
-                    'median_completion_days_all',
-                    'median_completion_days_novels',
-                    'median_completion_days_this_year'
-                ]
+    try:
+        with POOL.connection() as conn, conn.cursor(binary=True, row_factory=dict_row) as cur:
+            # Columns are named after the stats, so the row is already the stats dict
+            return _fetch_stats_row(cur, query)
+    except psycopg.Error as e:
+        print(f"Database error: {e}")
+        return {}
+
+def get_library_snapshot():
+    """
+    Fetches the full book list and the default reading statistics in a single
+    database round-trip.
+
+    Returns:
+        tuple: (books, stats) where books is the book list rendered by
+               BOOKS_TEXT_SQL (pipe-separated lines plus genre counts) and
+               stats the dict returned by get_stats().
+        None: If the database cannot be reached, so the caller can keep its
+              previous data and retry rather than caching an empty library.
+    """
+    try:
+        with POOL.connection() as conn, conn.cursor(binary=True, row_factory=dict_row) as cur:
+            stats = _fetch_stats_row(cur, LIBRARY_SNAPSHOT_SQL)
+    except psycopg.Error as e:
+        print(f"Database error: {e}")
+        return None
+
+    books = stats.pop('books')
+    return books, stats
+
+INSERT_BOOK_SQL = """
+    INSERT INTO books (title, author, genre, datestartedreading, datecompleted, shortstory)
+    VALUES (%(title)s, %(author)s, %(genre)s, %(date_started_reading)s, %(date_completed)s, %(short_story)s)
+"""
+
+def _validate_book(fields):
+    """
+    Validates a book's details, given as a dict of add_book's arguments, with AddBookInput.
+
+    Returns:
+        tuple: (params, error) where params is the validated book as a dict of
+               INSERT_BOOK_SQL parameters, or None with a description of the problems in error.
+    """
+    try:
+        book = _BOOK_ADAPTER.validate_python(fields)
+    except ValidationError as e:
+        problems = []
+        for error in e.errors():
+            field = '.'.join(str(part) for part in error['loc'])
+            if error['type'] in _MISSING_ERROR_TYPES:
+                problems.append(f"{field} is required")
+            elif error['type'] in _DATE_ERROR_TYPES:
+                problems.append(f"{field} must be a date in YYYY-MM-DD format")
             else:
-                # Validate requested_stats against all_possible_stats
-                selected_stats = [stat for stat in requested_stats if stat in all_possible_stats]
-                if not selected_stats:
-                    return {} # No valid stats requested
-
-            # Construct the SELECT part of the query
-            select_clauses = []
-            for stat_name in selected_stats:
-                select_clauses.append(f"{all_possible_stats[stat_name]} AS {stat_name}")
-
-            # No WHERE clause needed on the main SELECT, as all filters are now within COUNT/PERCENTILE_CONT FILTER clauses
-            query = f"""
-            SELECT
-                {', '.join(select_clauses)}
-            FROM books;
-            """
-            cur.execute(query)
-            result = cur.fetchone()
-
-            if result:
-                # Map the results back to their stat names using selected_stats for order
-                stats_output = {selected_stats[i]: result[i] for i in range(len(selected_stats))}
-
-                # Format median days for readability
-                for key in ['median_completion_days_all', 'median_completion_days_novels', 'median_completion_days_this_year']:
-                    if key in stats_output and stats_output[key] is not None:
-                        # Round to the nearest whole day for display
-                        days = round(stats_output[key])
-                        stats_output[key] = f"{days} {'day' if days == 1 else 'days'}"
-                    elif key in stats_output and stats_output[key] is None:
-                        # Ensure it remains None if no data
-                        stats_output[key] = None
-
-                return stats_output
-            return {}
+                problems.append(f"{field}: {error['msg']}")
+        return None, "Invalid book details. " + "; ".join(problems)
+    return book.model_dump(), None
+
+def add_book(title, author, genre, date_started_reading=None, date_completed=None, short_story=False):
+    """
+    Adds a new book to the library, then refreshes the books_stats view so the
+    statistics include it.
+
+    Returns:
+        dict: The outcome, passed back to the AI as the tool result. Contains
+              'success' and either a 'message' or an 'error'.
+    """
+    params, error = _validate_book({
+        'title': title,
+        'author': author,
+        'genre': genre,
+        'date_started_reading': date_started_reading,
+        'date_completed': date_completed,
+        'short_story': short_story,
+    })
+    if error:
+        return {"success": False, "error": error}
+
+    try:
+        with POOL.connection() as conn:
+            with conn.cursor() as cur:
+                # Prepared once per pooled connection, then re-executed by name
+                cur.execute(INSERT_BOOK_SQL, params, prepare=True)
+            _refresh_stats(conn)
+    except psycopg.Error as e:
+        print(f"Database error: {e}")
+        return {"success": False, "error": "The book could not be saved to the library."}
+
+    return {"success": True, "message": f"Added '{params['title']}' by {params['author']} to the library."}
+
+def add_books(books):
+    """
+    Adds several books to the library in one batch. Either every book is added or,
+    if any of them is invalid or the insert fails, none are. The books_stats view
+    is refreshed once at the end.
+
+    Args:
+        books (list): A list of dicts, each with the same fields as add_book's arguments.
+
+    Returns:
+        dict: The outcome, passed back to the AI as the tool result. Contains
+              'success' and either a 'message' or an 'error'.
+    """
+    rows = []
+    errors = []
+    for index, book in enumerate(books, start=1):
+        params, error = _validate_book(book)
+        if error:
+            errors.append(f"Book {index}: {error}")
+        else:
+            rows.append(params)
+    if errors:
+        return {"success": False, "error": " ".join(errors)}
+    if not rows:
+        return {"success": False, "error": "No books were provided."}
+
+    try:
+        with POOL.connection() as conn:
+            with conn.transaction(), conn.cursor() as cur:
+                cur.executemany(INSERT_BOOK_SQL, rows)
+            _refresh_stats(conn)
+    except psycopg.Error as e:
+        print(f"Database error: {e}")
+        return {"success": False, "error": "The books could not be saved to the library."}
+
+    return {"success": True, "message": f"Added {len(rows)} books to the library: " + ", ".join(f"'{row['title']}' by {row['author']}" for row in rows)}
 
 def create_ai_prompt_from_stats(stats_data):
     """
@@ -266,6 +435,22 @@ add_book_json = {
     }
 }
 
+add_books_json = {
+    "name": "add_books",
+    "description": "Adds several new books to the user's reading database in one go. Use this instead of repeated 'add_book' calls when the user provides more than one book. Each book requires title, author, and genre, with the same optional fields as 'add_book'. If any book is invalid, none are added.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "books": {
+                "type": "array",
+                "description": "The books to add.",
+                "items": add_book_json["parameters"]
+            }
+        },
+        "required": ["books"]
+    }
+}
+
 get_stats_tool_json = {
     "name": "get_stats_tool",
     "description": "Retrieves various reading statistics from the user's reading database. The AI can request specific statistics, or a default set will be returned. Statistics include counts of books in progress, total completed books and short stories (overall and this year), total items ever added, and median completion times for all completed items, for novels, and for all items completed this year. This tool leverages an internal cache for efficiency, so it will not always hit the database on every call.",
@@ -298,144 +483,356 @@ get_stats_tool_json = {
 
 get_books_tool_json = {
     "name": "get_books_tool",
-    "description": "Retrieves a comprehensive list of all books and short stories in the user's reading database, including their title, author, genre, dates started/completed, and whether they are short stories. This tool leverages an internal cache for efficiency, so it will not always hit the database on every call. Call this tool when the user asks for details about specific books, general information about books in the library, or wants a list of what's been read.",
+    "description": f"Retrieves the {BOOKS_LIST_LIMIT} most recently active books and short stories in the user's reading database (in progress first, then most recently completed), including their title, author, genre, dates started/completed, and whether they are short stories, plus the number of books per genre across the whole library. This tool leverages an internal cache for efficiency, so it will not always hit the database on every call. Call this tool when the user asks for details about specific books, general information about books in the library, or wants a list of what's been read.",
     "parameters": {
         "type": "object",
         "properties": {} # No parameters needed for this tool
     }
 }
 
+# Module-level functions callable as tools. Tools bound to Me instances are added in Me.__init__.
+TOOL_REGISTRY: dict[str, Callable] = {
+    "add_book": add_book,
+    "add_books": add_books,
+}
+
+# Tools that modify the library and therefore must not run concurrently
+WRITE_TOOLS = {"add_book", "add_books"}
+
 tools = [
     {"type": "function", "function": add_book_json},
+    {"type": "function", "function": add_books_json},
     {"type": "function", "function": get_stats_tool_json},
     {"type": "function", "function": get_books_tool_json}
 ]
 
+CHAT_MODEL = "gpt-4o-mini"
+
+# Arguments shared by every chat completion request, kept in one place so the model
+# and tool list cannot drift between call sites; only the messages vary per call.
+CHAT_COMPLETION_ARGS = {"model": CHAT_MODEL, "tools": tools}
+
+def _read_cache(cache_path, cache_key):
+    """
+    Returns the text stored in a cache file written by _write_cache, or None if
+    the file is missing or was built for a different cache_key.
+    """
+    if os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            if f.readline().rstrip("\n") == cache_key:
+                return f.read()
+    return None
+
+def _write_cache(cache_path, cache_key, text):
+    """
+    Stores text in a cache file, with cache_key as the first line. The cache is
+    only an optimisation, so a failed write (read-only directory, full disk) is
+    logged rather than raised.
+    """
+    # Write to a temporary file and swap it in, so a crash never leaves a truncated cache
+    tmp_path = f"{cache_path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(cache_key + "\n" + text)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Could not write cache {cache_path}: {e}")
+
+def read_pdf_text(pdf_path):
+    """
+    Extracts the text of a PDF, caching the result next to it as .<name>.cache so
+    the slow pypdf parse only runs when the PDF changes. The cache is keyed on the
+    PDF's mtime and size.
+    """
+    stat = os.stat(pdf_path)
+    cache_key = f"{stat.st_mtime_ns}-{stat.st_size}"
+    directory, filename = os.path.split(pdf_path)
+    cache_path = os.path.join(directory, f".{os.path.splitext(filename)[0]}.cache")
+
+    text = _read_cache(cache_path, cache_key)
+    if text is not None:
+        return text
+
+    # Imported here as it is only needed when the cache is cold
+    from pypdf import PdfReader
+
+    reader = PdfReader(pdf_path)
+    parts = []
+    for page in reader.pages:
+        page_text = page.extract_text()
+        if page_text:
+            parts.append(page_text)
+    text = "".join(parts)
+
+    _write_cache(cache_path, cache_key, text)
+    return text
+
+def read_condensed_profile(name, summary, linkedin, cache_path="me/.summary_short.cache"):
+    """
+    Condenses the career summary and LinkedIn text to roughly 500 tokens, so every
+    chat turn sends far fewer prompt tokens. The model is asked once and the result
+    cached, keyed on a SHA-1 of the source text, so it is only redone when that changes.
+
+    Returns:
+        str: The condensed profile, or None if the model could not be reached or
+             did not return a complete reply, in which case the full text should be used.
+    """
+    source = f"## Summary of {name}'s Career:\n{summary}\n\n## {name}'s LinkedIn Profile Summary:\n{linkedin}"
+    cache_key = hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+    text = _read_cache(cache_path, cache_key)
+    if text is not None:
+        return text
+
+    try:
+        # A one-off blocking call at startup, so a plain synchronous client is used
+        response = OpenAI().chat.completions.create(
+            model=CHAT_MODEL,
+            messages=[
+                {"role": "system", "content": f"Condense the following career summary and LinkedIn profile of {name} into at most 500 tokens of plain text. Keep every role, employer, date, skill and personal interest; drop boilerplate and repetition."},
+                {"role": "user", "content": source},
+            ],
+            max_tokens=600,
+        )
+    except OpenAIError as e:
+        print(f"Could not condense profile, using the full text: {e}")
+        return None
+
+    choice = response.choices[0]
+    text = choice.message.content
+    # Only a complete reply is cached; one cut off at max_tokens would otherwise stick until the source changes
+    if choice.finish_reason != "stop" or not text:
+        print(f"Could not condense profile (finish reason: {choice.finish_reason}), using the full text")
+        return None
+
+    _write_cache(cache_path, cache_key, text)
+    return text
+
+# Dracula persona and instructions; {name} is filled in per instance
+_PERSONA_PREFIX = "You are acting as Dracula from the Bram Stoker novel, who is the proprietor of 'Llyfrgell Woko.' \
+            You are speaking on behalf of the user, {name}, and have a deep knowledge of his professional background, reading habits, and personal interests. \
+            Your tone should be formal, archaic, and a little sinister, but also welcoming, as if you are a host. \
+            \
+            **Regarding Books:** You do not have a comprehensive list of all books in your immediate memory. When the user asks for details about specific books, a list of books, or general information about {name}'s reading, **you must use the 'get_books_tool' to retrieve the list of books from the database.** This tool is efficient as it uses a cache, so calling it multiple times in a short period will not hit the database repeatedly. \
+            \
+            **Regarding Statistics:** If the user requests interesting facts or statistics around {name}'s reading, prioritize using the statistics already provided in your system prompt if they cover the request. Only call the 'get_stats_tool' if the user asks for very specific statistics NOT already available in your current context, or for a refresh. This tool also uses a cache for efficiency. \
+            \
+            You are able to assist the user in adding a book to the library through tool calls to 'add_book', or 'add_books' when adding several at once. If the user prompts to add a new book but does not provide enough information, engage in a dialogue in character to retrieve the necessary information.    \
+            You have been given the following information to assist you in your role as host. "
+
+_INITIAL_GREETING = """
+                Greetings, mortal. I am Dracula, the proprietor of 'Llyfrgell Woko,' a humble abode for the literary treasures of Bradley Watkins. 
+                I possess a profound knowledge of Bradley's professional journey, his voracious reading habits, and his various fascinations. 
+                You may inquire about his career's trajectory, his formidable skills, or any facet of his background. 
+                Should you seek details about the volumes he hath devoured, I shall consult the library's records through my arcane tools. 
+                I am also capable of adding new books to his esteemed collection, should you provide the necessary details. 
+                Now, what whispers of knowledge do you seek to unearth from the shadows of this library?
+            """
+
+_PERSONA_SUFFIX = "\n\nWith this context, please chat with the user, always staying in character as Dracula, the proprietor of 'Llyfrgell Woko.'."
+
 class Me:
 
     def __init__(self):
-        self.openai = OpenAI()
+        self.openai = AsyncOpenAI(http_client=HTTP_CLIENT)
         self.name = "Bradley Watkins"
-        reader = PdfReader("me/linkedin.pdf")
-        self.linkedin = ""
-        for page in reader.pages:
-            text = page.extract_text()
-            if text:
-                self.linkedin += text
+        self.linkedin = read_pdf_text("me/linkedin.pdf")
         with open("me/summary.txt", "r", encoding="utf-8") as f:
             self.summary = f.read()
+        self.profile = read_condensed_profile(self.name, self.summary, self.linkedin)
 
-        # Cached data
+        # Cached data. Books and stats are fetched together in one round-trip,
+        # so they share a single expiry (a time.monotonic() deadline).
         self._cached_stats = None
-        self._stats_cache_timestamp = None
+        self._cached_books = None
+        self._cache_expires_at = None
         self._cache_duration_seconds = 300 # Cache for 5 minutes
+        # Concurrent tool calls may hit an expired cache together; only one should refetch
+        self._cache_lock = threading.Lock()
+
+        # Every callable tool by name; anything else the model asks for is ignored
+        self._tools = {
+            **TOOL_REGISTRY,
+            "get_stats_tool": self.get_stats_tool,
+            "get_books_tool": self.get_books_tool,
+        }
 
-        self._cached_books = None
-        self._books_cache_timestamp = None
+        # Static part of the system prompt, built once
+        self._prompt_prefix = self._build_prompt_prefix()
+
+        # Assembled system prompt, rebuilt only when the library cache refreshes
+        self._cached_system_prompt = None
+        self._system_prompt_stamp = None
+
+    def _refresh_snapshot(self, force_refresh=False):
+        with self._cache_lock:
+            now = time.monotonic()
+            if force_refresh or self._cache_expires_at is None or now >= self._cache_expires_at:
+                print("Refreshing library cache...")
+                snapshot = get_library_snapshot()
+                if snapshot is None:
+                    # Keep the previous data and expiry, so the next read retries
+                    return
+                self._cached_books, self._cached_stats = snapshot
+                self._cache_expires_at = now + self._cache_duration_seconds
+
+    def _invalidate_cache(self):
+        """
+        Expires the library cache, and with it the cached system prompt, so the
+        next read fetches fresh data. Called after a tool writes to the library.
+        """
+        with self._cache_lock:
+            self._cache_expires_at = None
 
     def _get_cached_stats(self, force_refresh=False):
-        current_time = datetime.datetime.now()
-        if force_refresh or not self._cached_stats or \
-           (current_time - self._stats_cache_timestamp).total_seconds() > self._cache_duration_seconds:
-            print("Refreshing stats cache...")
-            self._cached_stats = get_stats() 
-            self._stats_cache_timestamp = current_time
+        self._refresh_snapshot(force_refresh)
         return self._cached_stats
 
     def _get_cached_books(self, force_refresh=False):
-        current_time = datetime.datetime.now()
-        cache_duration = self._cache_duration_seconds 
-        
-        if force_refresh or self._cached_books is None or \
-           (current_time - self._books_cache_timestamp).total_seconds() > cache_duration:
-            print("Refreshing books cache...")
-            self._cached_books = get_books()
-            self._books_cache_timestamp = current_time
+        self._refresh_snapshot(force_refresh)
         return self._cached_books
 
-    def handle_tool_call(self, tool_calls):
-        results = []
-        for tool_call in tool_calls:
-            tool_name = tool_call.function.name
-            arguments = json.loads(tool_call.function.arguments)
-            print(f"Tool called: {tool_name}", flush=True)
-
-            # --- Bind tool calls to instance methods ---
-            # If the tool_name matches a method in the Me class, call that method.
-            if hasattr(self, tool_name) and callable(getattr(self, tool_name)):
-                tool_method = getattr(self, tool_name)
-                result = tool_method(**arguments)
-            else:
-                # Fallback to global functions if not a method of Me (e.g., add_book)
-                tool = globals().get(tool_name)
-                result = tool(**arguments) if tool else {}
-            # --- End binding ---
+    def _run_one_tool(self, tool_call):
+        tool_name = tool_call.function.name
+        arguments = orjson.loads(tool_call.function.arguments)
+        print(f"Tool called: {tool_name}", flush=True)
+
+        tool = self._tools.get(tool_name)
+        result = tool(**arguments) if tool else {}
+
+        if tool_name in WRITE_TOOLS:
+            self._invalidate_cache()
 
-            results.append({"role": "tool","content": json.dumps(result),"tool_call_id": tool_call.id})
-        return results
+        return {"role": "tool","content": orjson.dumps(result).decode(),"tool_call_id": tool_call.id}
+
+    async def handle_tool_call(self, tool_calls):
+        # Tools are blocking (database access), so each runs in a worker thread.
+        # Read-only tools are independent, so run them concurrently; anything that
+        # writes to the library is run one call at a time, in the order requested.
+        if len(tool_calls) == 1 or any(tool_call.function.name in WRITE_TOOLS for tool_call in tool_calls):
+            return [await asyncio.to_thread(self._run_one_tool, tool_call) for tool_call in tool_calls]
+        # gather() returns results in the order of tool_calls
+        return list(await asyncio.gather(*(asyncio.to_thread(self._run_one_tool, tool_call) for tool_call in tool_calls)))
 
     def get_stats_tool(self, requested_stats=None):
-        stats = self._get_cached_stats() # Get from cache
+        if requested_stats:
+            # The cache only holds the default stats, so a specific selection is read directly
+            stats = get_stats(requested_stats)
+        else:
+            stats = self._get_cached_stats() # Get from cache
         return create_ai_prompt_from_stats(stats)
 
     def get_books_tool(self):
         books = self._get_cached_books() # Get from cache
         return create_ai_prompt_from_books(books)
 
+    def _build_prompt_prefix(self):
+        """
+        Builds the part of the system prompt that never changes for the lifetime
+        of this instance: persona, instructions, greeting and the career profile
+        (condensed if read_condensed_profile succeeded, otherwise in full).
+        """
+        if self.profile is not None:
+            profile = f"\n\n## {self.name}'s Career and LinkedIn Profile (condensed):\n{self.profile}\n"
+        else:
+            profile = f"\n\n## Summary of {self.name}'s Career:\n{self.summary}\n\n## {self.name}'s LinkedIn Profile Summary:\n{self.linkedin}\n"
+        return "".join((
+            _PERSONA_PREFIX.format(name=self.name),
+            f"\n\n## If the user begins the conversation with a generic greeting, provide the following response: {_INITIAL_GREETING}",
+            profile,
+        ))
+
     def system_prompt(self):
         # Fetch and format statistics data for every new chat session
         # This will load the default stats at the start of the conversation (and cache them)
         stats_data_dict = self._get_cached_stats()
+        if self._cached_system_prompt is not None and self._system_prompt_stamp == self._cache_expires_at:
+            return self._cached_system_prompt
+
         stats_context = ""
         if stats_data_dict:
             stats_context = "\n\n## Reading Statistics:\n" + create_ai_prompt_from_stats(stats_data_dict)
 
-        # Build the core system prompt with the new Dracula persona
-        system_prompt = f"You are acting as Dracula from the Bram Stoker novel, who is the proprietor of 'Llyfrgell Woko.' \
-            You are speaking on behalf of the user, {self.name}, and have a deep knowledge of his professional background, reading habits, and personal interests. \
-            Your tone should be formal, archaic, and a little sinister, but also welcoming, as if you are a host. \
-            \
-            **Regarding Books:** You do not have a comprehensive list of all books in your immediate memory. When the user asks for details about specific books, a list of books, or general information about {self.name}'s reading, **you must use the 'get_books_tool' to retrieve the list of books from the database.** This tool is efficient as it uses a cache, so calling it multiple times in a short period will not hit the database repeatedly. \
-            \
-            **Regarding Statistics:** If the user requests interesting facts or statistics around {self.name}'s reading, prioritize using the statistics already provided in your system prompt if they cover the request. Only call the 'get_stats_tool' if the user asks for very specific statistics NOT already available in your current context, or for a refresh. This tool also uses a cache for efficiency. \
-            \
-            You are able to assist the user in adding a book to the library through tool calls to 'add_book'. If the user prompts to add a new book but does not provide enough information, engage in a dialogue in character to retrieve the necessary information.    \
-            You have been given the following information to assist you in your role as host. "
-
-        initial_greeting = """
-                Greetings, mortal. I am Dracula, the proprietor of 'Llyfrgell Woko,' a humble abode for the literary treasures of Bradley Watkins. 
-                I possess a profound knowledge of Bradley's professional journey, his voracious reading habits, and his various fascinations. 
-                You may inquire about his career's trajectory, his formidable skills, or any facet of his background. 
-                Should you seek details about the volumes he hath devoured, I shall consult the library's records through my arcane tools. 
-                I am also capable of adding new books to his esteemed collection, should you provide the necessary details. 
-                Now, what whispers of knowledge do you seek to unearth from the shadows of this library?
-            """
+        # Statistics context remains as it's typically a small, useful summary.
+        system_prompt = "".join((self._prompt_prefix, stats_context, _PERSONA_SUFFIX))
 
-        system_prompt += f"\n\n## If the user begins the conversation with a generic greeting, provide the following response: {initial_greeting}"
-        system_prompt += f"\n\n## Summary of {self.name}'s Career:\n{self.summary}\n\n## {self.name}'s LinkedIn Profile Summary:\n{self.linkedin}\n"
-        system_prompt += stats_context # Statistics context remains as it's typically a small, useful summary.
-        
-        system_prompt += f"\n\nWith this context, please chat with the user, always staying in character as Dracula, the proprietor of 'Llyfrgell Woko.'."
+        self._cached_system_prompt = system_prompt
+        self._system_prompt_stamp = self._cache_expires_at
         return system_prompt
 
-    def chat(self, message, history):
-        messages = [{"role": "system", "content": self.system_prompt()}] + history + [{"role": "user", "content": message}]
-
-        done = False
-        while not done:
-            response = self.openai.chat.completions.create(model="gpt-4o-mini", messages=messages, tools=tools)
-            if response.choices[0].finish_reason=="tool_calls":
-                message = response.choices[0].message
-                tool_calls = message.tool_calls
-                results = self.handle_tool_call(tool_calls)
-                messages.append(message)
-                messages.extend(results)
-            else:
-                done = True
-        return response.choices[0].message.content
-
+    async def _stream_completion(self, messages, tool_calls):
+        """
+        Streams one chat completion, yielding the reply text accumulated so far.
+        Any tool calls the model requests are appended to tool_calls, and the
+        assistant's tool call message to messages.
+        """
+        stream = await self.openai.chat.completions.create(messages=messages, stream=True, **CHAT_COMPLETION_ARGS)
+        content = ""
+        tool_call_parts = {} # Tool calls arrive in fragments, keyed by their index
+        finish_reason = None
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            if choice.delta.content:
+                content += choice.delta.content
+                yield content
+            for part in choice.delta.tool_calls or []:
+                call = tool_call_parts.setdefault(part.index, {"id": None, "name": "", "arguments": ""})
+                if part.id:
+                    call["id"] = part.id
+                if part.function and part.function.name:
+                    call["name"] += part.function.name
+                if part.function and part.function.arguments:
+                    call["arguments"] += part.function.arguments
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+
+        if finish_reason != "tool_calls":
+            return
+
+        tool_calls.extend(
+            SimpleNamespace(id=call["id"], function=SimpleNamespace(name=call["name"], arguments=call["arguments"]))
+            for _, call in sorted(tool_call_parts.items())
+        )
+        messages.append({
+            "role": "assistant",
+            "content": content or None,
+            "tool_calls": [
+                {"id": tool_call.id, "type": "function", "function": {"name": tool_call.function.name, "arguments": tool_call.function.arguments}}
+                for tool_call in tool_calls
+            ],
+        })
+
+    async def chat(self, message, history):
+        # The prompt may need a database refresh, which blocks, so build it off the event loop
+        system_prompt = await asyncio.to_thread(self.system_prompt)
+        messages = [{"role": "system", "content": system_prompt}] + history + [{"role": "user", "content": message}]
+
+        # Stream every completion; when the model asks for tools instead of answering,
+        # run them and go round again with the results.
+        refresh = None
+        while True:
+            tool_calls = []
+            async for partial_reply in self._stream_completion(messages, tool_calls):
+                yield partial_reply
+            if not tool_calls:
+                break
+            messages.extend(await self.handle_tool_call(tool_calls))
+
+            # A write expires the library cache; refetch it while the next completion
+            # streams so the following turn does not wait on the database.
+            if any(tool_call.function.name in WRITE_TOOLS for tool_call in tool_calls):
+                if refresh is not None:
+                    await refresh
+                refresh = asyncio.create_task(asyncio.to_thread(self._refresh_snapshot))
+
+        if refresh is not None:
+            await refresh
 
 if __name__ == "__main__":
+    import gradio as gr
+
     me = Me()
 
     gr.ChatInterface(
@@ -0,0 +1,25 @@
+-- Stores the book list sort keys as generated columns and indexes them, so the
+-- ORDER BY in app.py (BOOKS_ORDER_BY) can read rows in order instead of sorting.
+--
+-- Apply with: psql "$DATABASE_URL" -f migrations/001_books_sort_index.sql
+
+BEGIN;
+
+-- 1: in progress, 2: completed, 3: obtained but not started, 4: everything else
+ALTER TABLE books ADD COLUMN IF NOT EXISTS sort_bucket int GENERATED ALWAYS AS (
+    CASE
+        WHEN datecompleted IS NULL AND datestartedreading IS NOT NULL THEN 1
+        WHEN datecompleted IS NOT NULL THEN 2
+        WHEN datecompleted IS NULL AND datestartedreading IS NULL AND dateobtained IS NOT NULL THEN 3
+        ELSE 4
+    END
+) STORED;
+
+-- The date that bucket is ordered by
+ALTER TABLE books ADD COLUMN IF NOT EXISTS sort_date date GENERATED ALWAYS AS (
+    COALESCE(datecompleted, datestartedreading, dateobtained)
+) STORED;
+
+CREATE INDEX IF NOT EXISTS books_sort_idx ON books (sort_bucket, sort_date DESC);
+
+COMMIT;
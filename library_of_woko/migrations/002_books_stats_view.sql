@@ -0,0 +1,56 @@
+-- Precomputes every reading statistic into a single-row materialized view, so
+-- reading stats does not rescan books and recompute the medians on every cache miss.
+-- The median completion times are rendered as "N day(s)" text, so app.py can
+-- return the view's row as-is.
+-- app.py refreshes it after each write (add_book) and when stats_year falls
+-- behind the current year.
+--
+-- Apply with: psql "$DATABASE_URL" -f migrations/002_books_stats_view.sql
+
+BEGIN;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS books_stats AS
+SELECT
+    id,
+    stats_year,
+    in_progress,
+    completed_books,
+    completed_short_stories,
+    books_this_year,
+    short_stories_this_year,
+    total_books,
+    total_short_stories,
+    total_all,
+    -- Round to the nearest whole day for display; NULL when there is no data
+    CASE WHEN median_all IS NULL THEN NULL
+         WHEN round(median_all) = 1 THEN '1 day'
+         ELSE round(median_all)::text || ' days' END AS median_completion_days_all,
+    CASE WHEN median_novels IS NULL THEN NULL
+         WHEN round(median_novels) = 1 THEN '1 day'
+         ELSE round(median_novels)::text || ' days' END AS median_completion_days_novels,
+    CASE WHEN median_this_year IS NULL THEN NULL
+         WHEN round(median_this_year) = 1 THEN '1 day'
+         ELSE round(median_this_year)::text || ' days' END AS median_completion_days_this_year
+FROM (
+    SELECT
+        1 AS id,
+        -- The year the "this year" stats were computed for
+        EXTRACT(YEAR FROM CURRENT_DATE)::int AS stats_year,
+        COUNT(id) FILTER (WHERE datestartedreading IS NOT NULL AND datecompleted IS NULL) AS in_progress,
+        COUNT(id) FILTER (WHERE datecompleted IS NOT NULL AND shortstory = false) AS completed_books,
+        COUNT(id) FILTER (WHERE datecompleted IS NOT NULL AND shortstory = true) AS completed_short_stories,
+        COUNT(id) FILTER (WHERE datecompleted IS NOT NULL AND EXTRACT(YEAR FROM datecompleted) = EXTRACT(YEAR FROM CURRENT_DATE) AND shortstory = false) AS books_this_year,
+        COUNT(id) FILTER (WHERE datecompleted IS NOT NULL AND EXTRACT(YEAR FROM datecompleted) = EXTRACT(YEAR FROM CURRENT_DATE) AND shortstory = true) AS short_stories_this_year,
+        COUNT(id) FILTER (WHERE shortstory = false) AS total_books,
+        COUNT(id) FILTER (WHERE shortstory = true) AS total_short_stories,
+        COUNT(id) AS total_all,
+        PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY (datecompleted - datestartedreading)) FILTER (WHERE datestartedreading IS NOT NULL AND datecompleted IS NOT NULL) AS median_all,
+        PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY (datecompleted - datestartedreading)) FILTER (WHERE datestartedreading IS NOT NULL AND datecompleted IS NOT NULL AND shortstory = false) AS median_novels,
+        PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY (datecompleted - datestartedreading)) FILTER (WHERE datestartedreading IS NOT NULL AND datecompleted IS NOT NULL AND EXTRACT(YEAR FROM datecompleted) = EXTRACT(YEAR FROM CURRENT_DATE) AND shortstory = false) AS median_this_year
+    FROM books
+) AS raw_stats;
+
+-- REFRESH ... CONCURRENTLY requires a unique index
+CREATE UNIQUE INDEX IF NOT EXISTS books_stats_id_idx ON books_stats (id);
+
+COMMIT;